@@ -12,8 +12,13 @@ import mmap
 
 VER = '0.1.1 (2018.09.07)'
 
+PREFETCH_SIZE = 64 * 1024
+JUMP_INTERVAL = 16      # ms; the hex view is redrawn at most once per interval
 
-NONPRINTABLE = (0, 7, 8, 9, 10, 13)
+NONPRINTABLE = frozenset((0, 7, 8, 9, 10, 13))
+PRINTABLE_MAP = bytes(32 if i in NONPRINTABLE else i for i in range(256))
+HEX_TABLE = [('%02X' % i) for i in range(256)]
+HIGHLIGHT_BRUSH = QtGui.QBrush(QtGui.QColor('#DDDD55'))
 HEADER_CSS = '''
 ::section {
     border: 0px;
@@ -55,7 +60,7 @@ class DataView:
     """
 
     def __init__(self, data=None, filename=None, readonly=True):
-        if not (data or filename):
+        if data is None and filename is None:
             raise ValueError('Raw data or a filename must be provided!')
         if data and not readonly and type(data) is bytes:
             data = bytearray(data)
@@ -73,18 +78,42 @@ class DataView:
         if self._data is not None:
             return self._data
         if self.filename:
-            mode, access  = 'r+', mmap.ACCESS_READ
-            if not self.readonly:
-                mode += 'w'
-                access |= mmap.ACCESS_WRITE
+            mode, access = ('rb', mmap.ACCESS_READ) if self.readonly else ('r+b', mmap.ACCESS_WRITE)
             self.fh = open(self.filename, mode)
             self.mm = mmap.mmap(self.fh.fileno(), 0, access=access)
+            if hasattr(mmap, 'MADV_RANDOM'):
+                self.mm.madvise(mmap.MADV_RANDOM)
             self._data = self.mm
         else:
             self._data = self.rawdata
         return self._data
 
 
+    def window(self, offs, size):
+        """
+        Return a copy of `size` bytes starting at `offs` as a compact bytes object.
+
+        The data is sliced through a (released) memoryview, so bytearray / mmap sources aren't copied twice.
+        """
+        with memoryview(self.data) as mv:
+            return mv[offs:offs + size].tobytes()
+
+
+    def prefetch(self, offs, size=0):
+        """
+        Hint the OS to page in the file view around the given window (PREFETCH_SIZE bytes before / after it).
+
+        Does nothing for raw data or on platforms without madvise().
+        """
+        if not self.filename or not hasattr(mmap, 'MADV_WILLNEED'):
+            return
+        mm = self.data
+        start = max(0, offs - PREFETCH_SIZE) // mmap.PAGESIZE * mmap.PAGESIZE
+        end = min(len(mm), offs + size + PREFETCH_SIZE)
+        if end > start:
+            mm.madvise(mmap.MADV_WILLNEED, start, end - start)
+
+
     def close(self):
         """
         Close the file (if open).
@@ -110,6 +139,103 @@ class DataView:
 
 
 
+class HexModel(QtCore.QAbstractTableModel):
+    """
+    Table model behind QHexEditor: the hex dump / text cells are generated on demand from the current data window.
+
+    :param columns: Number of bytes per row.
+    :param rows: Number of (visible) rows.
+    """
+
+    def __init__(self, columns=16, rows=1):
+        super().__init__()
+        self.columns = columns
+        self.rows = rows
+        self.window = b''
+        self.text = ''
+        self.addrlabels = []
+        self.hheaders = [str(x) for x in range(self.columns)] + [''] * self.columns
+        self.backgrounds = {}
+        self.brushes = (QtGui.QBrush(QtGui.QColor('#800')), QtGui.QBrush(QtGui.QColor('#008')))
+        self.col_brushes = [self.brushes[x % 2] for x in range(self.columns)] * 2
+
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 2 * self.columns
+
+
+    def data(self, index, role=Qt.DisplayRole):
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            idx = row * self.columns + col % self.columns
+            if idx >= len(self.window):
+                return None
+            return HEX_TABLE[self.window[idx]] if col < self.columns else self.text[idx]
+        elif role == Qt.ForegroundRole:
+            return self.col_brushes[col]
+        elif role == Qt.BackgroundRole:
+            return self.backgrounds.get((row, col))
+        elif role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.hheaders[section]
+        return self.addrlabels[section] if section < len(self.addrlabels) else None
+
+
+    def set_rows(self, rows):
+        """
+        Change the number of (visible) rows.
+        """
+        if rows > self.rows:
+            self.beginInsertRows(QtCore.QModelIndex(), self.rows, rows - 1)
+            self.rows = rows
+            self.endInsertRows()
+        elif rows < self.rows:
+            self.beginRemoveRows(QtCore.QModelIndex(), rows, self.rows - 1)
+            self.rows = rows
+            self.endRemoveRows()
+
+
+    def set_window(self, window, addrlabels):
+        """
+        Replace the data window (and the row address labels) and notify the view.
+        """
+        self.window = window
+        self.text = window.translate(PRINTABLE_MAP).decode('cp437')
+        self.addrlabels = addrlabels
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rows - 1, 2 * self.columns - 1))
+            self.headerDataChanged.emit(Qt.Vertical, 0, self.rows - 1)
+
+
+    def set_backgrounds(self, cells, brush):
+        """
+        Set the background of the given (row, col) cells (None restores the default one).
+
+        A single dataChanged signal is emitted for the bounding rectangle of the cells.
+        """
+        if not cells:
+            return
+        for cell in cells:
+            if brush is None:
+                self.backgrounds.pop(cell, None)
+            else:
+                self.backgrounds[cell] = brush
+        rows, cols = zip(*cells)
+        self.dataChanged.emit(self.index(min(rows), min(cols)), self.index(max(rows), max(cols)))
+
+
+
 class QHexEditor(QtWidgets.QWidget):
     """
     Hex editor widget.
@@ -126,6 +252,7 @@ class QHexEditor(QtWidgets.QWidget):
         self.columns = columns
         self.rows = 1
         self.perpage = self.columns * self.rows
+        self._rowoffs = [0]
         self.dm = None
         self.hexview = QtWidgets.QTableView(font=self.font, showGrid=0, styleSheet=TABLE_CSS)
         self.hexview.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
@@ -153,10 +280,16 @@ class QHexEditor(QtWidgets.QWidget):
         self.setMinimumWidth(800)
         self.connect(QtWidgets.QShortcut(QtGui.QKeySequence("Esc"), self), SIGNAL('activated()'), sys.exit)
         self._data = None
-        self.dm = QtGui.QStandardItemModel(self.rows, self.columns)
+        self._jump_timer = QtCore.QTimer(self)
+        self._jump_timer.setInterval(JUMP_INTERVAL)
+        self._jump_timer.setSingleShot(True)
+        self._jump_timer.timeout.connect(self._do_jump)
+        self.dm = HexModel(self.columns, self.rows)
         self.hexview.setModel(self.dm)
         self.hexview.horizontalHeader().setStretchLastSection(0)
-        self.hexview.selectionModel().selectionChanged.connect(self.sel_changed)
+        self._selmodel = self.hexview.selectionModel()
+        self._selmodel.selectionChanged.connect(self.sel_changed)
+        self._format_view()
         self.open(data, filename, readonly)
         self.jump()
 
@@ -165,18 +298,12 @@ class QHexEditor(QtWidgets.QWidget):
         """
         Selection changing is monitored to allow highlighting matching selected bytes between the hex dump and the text.
         """
-        new, old = ([(e.row(), (e.column() + self.columns) % (2 * self.columns)) for e in lst.indexes()] \
+        new, old = ({(e.row(), (e.column() + self.columns) % (2 * self.columns)) for e in lst.indexes()} \
                 for lst in (new, old))
-        for e in old:
-            if e in new:
-                continue
-            self.dm.item(*e).setBackground(QtGui.QColor('#FFFFFF'))
-        for e in new:
-            if e in old:
-                continue
-            self.dm.item(*e).setBackground(QtGui.QColor('#DDDD55'))
+        self.dm.set_backgrounds(old - new, None)
+        self.dm.set_backgrounds(new - old, HIGHLIGHT_BRUSH)
         if self.statusbar:
-            idx = self.hexview.selectionModel().currentIndex()
+            idx = self._selmodel.currentIndex()
             offs = self.offs + idx.row() * self.columns + idx.column()
             self.status['offset'].setText('<b>0x%X</b> (%d)' % (offs, offs))
 
@@ -208,18 +335,40 @@ class QHexEditor(QtWidgets.QWidget):
         """
         This keeps self.rows/columns/perpage updated and regenerates the self.hexdump content.
         """
-        self.rows = (self.hexview.height() - self.hexview.horizontalHeader().height() - 6) // self.row_height
+        self.rows = max(0, (self.hexview.height() - self.hexview.horizontalHeader().height() - 6) // self.row_height)
         self.perpage = self.columns * self.rows
-        self.dm.setRowCount(self.rows)
+        self._rowoffs = [i * self.columns for i in range(self.rows)]
+        self.dm.set_rows(self.rows)
+        self._format_view()
+        self._force_redraw = True
         self.jump(self.offs)
         super().resizeEvent(evt)
 
 
+    def _format_view(self):
+        """
+        Set the header / section sizes and styles (constant across jumps, only needs refreshing on resize).
+        """
+        hv = self.hexview
+        vh = hv.verticalHeader()
+        hh = hv.horizontalHeader()
+        self._char_w = hv.fontMetrics().width('A') + 2
+        hh.setDefaultSectionSize(self._char_w)
+        hh.setMaximumSectionSize(hv.fontMetrics().width('AAA'))
+        for i in range(self.columns):
+            hh.resizeSection(i, self._char_w)
+        vh.setDefaultSectionSize(self.row_height)
+        vh.setDefaultAlignment(Qt.AlignCenter)
+        vh.setStyleSheet(HEADER_CSS)
+        hh.setStyleSheet(HEADER_CSS)
+
+
     def open(self, data=None, filename=None, readonly=True):
         """
         Open a file (or a data buffer).
         """
         self.offs = 0
+        self._force_redraw = True
         if self._data is not None:
             self._data.close()
         self._data = DataView(data=data, filename=filename, readonly=readonly)
@@ -257,48 +406,36 @@ class QHexEditor(QtWidgets.QWidget):
 
     def jump(self, offs=0):
         """
-        Jump to the given offset (this is the main workhorse which updates the self.hexview contents).
+        Jump to the given offset.
+
+        The self.hexview contents are updated by ._do_jump() at most once per JUMP_INTERVAL ms, so bursts of
+        wheel / scroll events are coalesced into a single redraw.
+        """
+        offs = max(0, min(offs, self.size - self.perpage))
+        if offs == self.offs and not self._force_redraw:
+            return
+        self.offs = offs
+        if not self._jump_timer.isActive():
+            self._jump_timer.start()
+
+
+    def _do_jump(self):
+        """
+        Update the self.hexview contents for the current offset (this is the main workhorse behind .jump()).
         """
-        brushes = [QtGui.QBrush(QtGui.QColor(x)) for x in ('#800', '#008')]
         hv = self.hexview
-        crt = hv.selectionModel().currentIndex()
-        vh = hv.verticalHeader()
-        hh = hv.horizontalHeader()
+        crt = self._selmodel.currentIndex()
+        hv.setUpdatesEnabled(False)
+        self._force_redraw = False
         ### get data window
-        self.offs = max(0, min(offs, self.size - self.perpage))
-        data = self._data[self.offs:self.offs + self.perpage]
-        ### generate & set labels
-        addrlabels = ['%08X' % i for i in range(self.offs, self.offs + self.perpage, self.columns)]
-        self.dm.setVerticalHeaderLabels(addrlabels)
-        self.dm.setHorizontalHeaderLabels([str(x) for x in range(self.columns)] + [''] * self.columns)
-        ### generate data for datamodel (actual hexview contents)
-        idx = 0   # offset inside the data window (index in `data`)
-        for row in range(self.rows):
-            for col in range(self.columns):
-                if idx < len(data):
-                    c = data[idx]
-                    hitem = QtGui.QStandardItem('%02X' % c)
-                    hitem.setTextAlignment(Qt.AlignCenter)
-                    hitem.setForeground(brushes[col % 2])
-                    titem = QtGui.QStandardItem(bytes([32 if c in NONPRINTABLE else c]).decode('cp437'))
-                    titem.setTextAlignment(Qt.AlignCenter)
-                    titem.setForeground(brushes[col % 2])
-                else:
-                    hitem = titem = None
-                self.dm.setItem(row, col, hitem)
-                self.dm.setItem(row, col + self.columns, titem)
-                idx += 1
-        ### format view
-        hh.setDefaultSectionSize(hv.fontMetrics().width('A') + 2)
-        hh.setMaximumSectionSize(hv.fontMetrics().width('AAA'))
-        for i in range(self.columns):
-            hh.resizeSection(i, hv.fontMetrics().width('A') + 2)
-        vh.setDefaultSectionSize(self.row_height)
-        vh.setDefaultAlignment(Qt.AlignCenter)
-        vh.setStyleSheet(HEADER_CSS)
-        hh.setStyleSheet(HEADER_CSS)
+        self._data.prefetch(self.offs, self.perpage)
+        data = self._data.window(self.offs, self.perpage)
+        ### generate labels & update the datamodel (the cells are generated lazily by HexModel.data())
+        addrlabels = ['%08X' % (self.offs + o) for o in self._rowoffs]
+        self.dm.set_window(data, addrlabels)
         ### restore pre-scroll selection
         hv.setCurrentIndex(crt)
+        hv.setUpdatesEnabled(True)
 
 
 
@@ -307,9 +444,8 @@ if __name__ == '__main__':
     import sys
     # data = bytes(random.randint(0, 255) for i in range(1024))
     fn = sys.argv[-1]   # filename given as parameter or the script itself
-    data = open(fn, 'rb').read()
     app = QtWidgets.QApplication()
-    he = QHexEditor(data=data)
+    he = QHexEditor(filename=fn)
     he.show()
     sys.exit(app.exec_())
 